@@ -1,12 +1,29 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from model_loader import analyze_log
+from model_loader import analyze_log, analyze_logs
 from typing import List, Optional, Dict
 import os
-import glob
+import mmap
+import time
 from datetime import datetime, timedelta
 import subprocess
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# The systemd bindings read the binary journal directly, skipping the
+# journalctl fork+exec and its text formatting; fall back to the CLI when
+# the bindings aren't installed
+try:
+    from systemd import journal
+except ImportError:
+    journal = None
+
+# io_uring batch-submits independent reads with one syscall per batch; fall
+# back to the thread pool when the bindings or kernel support are missing
+try:
+    import liburing
+except ImportError:
+    liburing = None
 
 app = FastAPI(
     title="KOTS and Helm Log Analyzer",
@@ -17,6 +34,7 @@ app = FastAPI(
 class AnalysisResponse(BaseModel):
     root_cause: str
     confidence: str
+    severity: str = "warning"
     next_steps: List[str]
     context: str
     timestamp: Optional[str] = None
@@ -33,7 +51,16 @@ class ConsolidatedAnalysisResponse(BaseModel):
     timestamp: str
 
 def get_journalctl_logs(service: str, hours: int = 24) -> str:
-    """Get logs from journalctl for a specific service."""
+    """Get logs from the systemd journal for a specific service."""
+    if journal is not None:
+        try:
+            reader = journal.Reader()
+            reader.add_match(_SYSTEMD_UNIT=service)
+            reader.seek_realtime(datetime.now() - timedelta(hours=hours))
+            return "\n".join(entry.get("MESSAGE", "") for entry in reader)
+        except Exception as e:
+            return f"Error reading systemd journal: {str(e)}"
+
     try:
         result = subprocess.run(
             ["journalctl", "--since", f"{hours} hours ago", "--no-pager", "-u", service],
@@ -44,98 +71,254 @@ def get_journalctl_logs(service: str, hours: int = 24) -> str:
     except Exception as e:
         return f"Error getting journalctl logs: {str(e)}"
 
+# Memoized mtime formatting: pod logs cluster on the same few seconds, so the
+# isoformat string is built once per distinct second instead of per file
+_ts_format_cache: Dict[int, str] = {}
+
+def _format_mtime(mtime: float) -> str:
+    key = int(mtime)
+    formatted = _ts_format_cache.get(key)
+    if formatted is None:
+        if len(_ts_format_cache) > 4096:
+            _ts_format_cache.clear()
+        formatted = datetime.fromtimestamp(key).isoformat()
+        _ts_format_cache[key] = formatted
+    return formatted
+
+# Only the tail of a log can be recent; bound how much of each file we scan
+_MAX_LOG_BYTES = 2 * 1024 * 1024
+
+def _read_tail(path: str, max_bytes: int = _MAX_LOG_BYTES) -> bytes:
+    """
+    Memory-map a file and return at most max_bytes from its end, aligned to
+    a line start. The kernel only pages in the tail window, and the raw
+    bytes go straight to the scanners — no full-file str copy or decode.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            if size > max_bytes:
+                start = size - max_bytes
+                newline = mm.find(b'\n', start)
+                if newline != -1:
+                    start = newline + 1  # skip the partial first line
+            return mm[start:]
+
+def _read_log_file(path: str, mtime: float):
+    """Read a log file, returning (path, mtime, text). Runs in a worker thread."""
+    return path, mtime, _read_tail(path)
+
+_IO_URING_DEPTH = 256
+
+def _read_files_io_uring(files: List[tuple]) -> List[tuple]:
+    """Tail-read all files through one io_uring, reaping completions in batches."""
+    ring = liburing.io_uring()
+    cqe = liburing.io_uring_cqe()
+    liburing.io_uring_queue_init(min(_IO_URING_DEPTH, len(files)), ring, 0)
+    results = []
+    try:
+        for start in range(0, len(files), _IO_URING_DEPTH):
+            pending = []
+            for path, mtime in files[start:start + _IO_URING_DEPTH]:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except OSError as e:
+                    print(f"Error reading log file {path}: {str(e)}")
+                    continue
+                size = os.fstat(fd).st_size
+                offset = max(0, size - _MAX_LOG_BYTES)
+                # The buffer must stay referenced (via pending) until the
+                # completion is reaped — the kernel writes into it directly
+                buf = bytearray(size - offset)
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_read(sqe, fd, buf, len(buf), offset)
+                sqe.user_data = len(pending) + 1  # liburing forbids user_data == 0
+                pending.append((path, mtime, fd, buf, offset))
+
+            if not pending:
+                continue
+            try:
+                liburing.io_uring_submit(ring)
+                for _ in range(len(pending)):
+                    liburing.io_uring_wait_cqe(ring, cqe)
+                    path, mtime, fd, buf, offset = pending[cqe.user_data - 1]
+                    nread = cqe.res
+                    liburing.io_uring_cqe_seen(ring, cqe)
+                    if nread < 0:
+                        # Log and skip the one failed read, matching the
+                        # thread-pool path's per-file error handling
+                        print(f"Error reading log file {path}: {os.strerror(-nread)}")
+                        continue
+                    data = bytes(buf[:nread])
+                    if offset:
+                        # Align to a line start, as _read_tail does
+                        data = data[data.find(b'\n') + 1:]
+                    results.append((path, mtime, data))
+            finally:
+                for _, _, fd, _, _ in pending:
+                    os.close(fd)
+    finally:
+        liburing.io_uring_queue_exit(ring)
+    return results
+
+def _read_files_parallel(files: List[tuple]) -> List[tuple]:
+    """Read (path, mtime) log files concurrently so disk reads overlap."""
+    results = []
+    if not files:
+        return results
+
+    if liburing is not None:
+        try:
+            return _read_files_io_uring(files)
+        except Exception as e:
+            print(f"io_uring read failed, falling back to thread pool: {str(e)}")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = {pool.submit(_read_log_file, path, mtime): path for path, mtime in files}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error reading log file {futures[future]}: {str(e)}")
+    return results
+
+def _scan_log_dir(dir_path: str, cutoff_ts: float):
+    """Yield (path, mtime) for .log files newer than cutoff, one stat per file."""
+    for entry in os.scandir(dir_path):
+        if entry.name.endswith('.log') and entry.is_file():
+            mtime = entry.stat().st_mtime
+            if mtime >= cutoff_ts:
+                yield entry.path, mtime
+
+def _iter_pod_logs(root: str, namespace: Optional[str], pod_name: Optional[str], cutoff_ts: float):
+    """
+    Yield (path, mtime) for containerd pod log files newer than cutoff.
+    Pod directories are named <namespace>_<pod>_<uid> with one subdirectory
+    per container holding the .log files.
+    """
+    for pod_entry in os.scandir(root):
+        if not pod_entry.is_dir():
+            continue
+        if namespace and not pod_entry.name.startswith(f"{namespace}_"):
+            continue
+        if pod_name and f"_{pod_name}_" not in pod_entry.name:
+            continue
+        for container_entry in os.scandir(pod_entry.path):
+            if not container_entry.is_dir():
+                continue
+            for entry in os.scandir(container_entry.path):
+                if entry.name.endswith('.log') and entry.is_file():
+                    mtime = entry.stat().st_mtime
+                    if mtime >= cutoff_ts:
+                        yield entry.path, mtime
+
 def get_pod_logs(log_dir: str, namespace: Optional[str] = None, pod_name: Optional[str] = None, hours: int = 24) -> List[LogFileResponse]:
     """Get and analyze pod logs from containerd directory."""
     results = []
     if not os.path.exists(log_dir):
         return results
-    
-    cutoff_time = datetime.now() - timedelta(hours=hours)
-    
-    # Construct the search pattern based on namespace and pod name filters
-    search_pattern = log_dir
-    if namespace:
-        search_pattern = os.path.join(search_pattern, f"{namespace}_*")
-    if pod_name:
-        search_pattern = os.path.join(search_pattern, f"*_{pod_name}_*")
-    search_pattern = os.path.join(search_pattern, "*.log")
-    
-    for log_file in glob.glob(search_pattern, recursive=True):
-        if os.path.getmtime(log_file) >= cutoff_time.timestamp():
-            try:
-                with open(log_file, 'r') as f:
-                    log_text = f.read()
-                    result = analyze_log(log_text)
-                    result["timestamp"] = datetime.fromtimestamp(os.path.getmtime(log_file)).isoformat()
-                    
-                    # Extract pod info from the path
-                    path_parts = log_file.split('/')
-                    pod_info = path_parts[-2] if len(path_parts) > 1 else "unknown"
-                    
-                    results.append({
-                        "filename": f"{pod_info}/{os.path.basename(log_file)}",
-                        "analysis": result
-                    })
-            except Exception as e:
-                print(f"Error reading log file {log_file}: {str(e)}")
-    
+
+    cutoff_ts = time.time() - hours * 3600
+
+    # Gather all log texts first so the model runs once over the whole batch
+    log_files = list(_iter_pod_logs(log_dir, namespace, pod_name, cutoff_ts))
+
+    entries = []
+    for log_file, mtime, log_text in _read_files_parallel(log_files):
+        # Extract pod info from the path: the last three components are
+        # <namespace>_<pod>_<uid>/<container>/<n>.log
+        path_parts = log_file.split('/')
+        pod_info = path_parts[-3] if len(path_parts) > 2 else "unknown"
+        container = path_parts[-2] if len(path_parts) > 1 else "unknown"
+
+        entries.append({
+            "filename": f"{pod_info}/{container}/{os.path.basename(log_file)}",
+            "text": log_text,
+            "timestamp": _format_mtime(mtime)
+        })
+
+    analyses = analyze_logs([entry["text"] for entry in entries])
+    for entry, result in zip(entries, analyses):
+        result["timestamp"] = entry["timestamp"]
+        results.append({
+            "filename": entry["filename"],
+            "analysis": result
+        })
+
     return results
 
+def _collect_embedded_cluster(hours: int) -> List[dict]:
+    """Read and analyze embedded-cluster log files and systemd service logs."""
+    # Gather all log texts first so the model runs once over the whole batch
+    cutoff_ts = time.time() - hours * 3600
+    log_files = []
+
+    # Check /var/log/embedded-cluster and the embedded-cluster data directory
+    for log_dir in ["/logs/embedded-cluster", "/logs/embedded-cluster-data"]:
+        if os.path.exists(log_dir):
+            log_files.extend(_scan_log_dir(log_dir, cutoff_ts))
+
+    entries = []
+    for log_file, mtime, log_text in _read_files_parallel(log_files):
+        entries.append({
+            "filename": os.path.basename(log_file),
+            "text": log_text,
+            "timestamp": _format_mtime(mtime)
+        })
+
+    # Get systemd service logs
+    services = ["k0scontroller.service", "k0sworker.service", "local-artifact-mirror.service"]
+    now_iso = datetime.now().isoformat()
+    for service in services:
+        log_text = get_journalctl_logs(service, hours)
+        if log_text:
+            entries.append({
+                "filename": f"journalctl-{service}",
+                "text": log_text,
+                "timestamp": now_iso
+            })
+
+    results = []
+    analyses = analyze_logs([entry["text"] for entry in entries])
+    for entry, result in zip(entries, analyses):
+        result["timestamp"] = entry["timestamp"]
+        results.append({
+            "filename": entry["filename"],
+            "analysis": result
+        })
+
+    return results
+
+def _collect_syslog(hours: int) -> Optional[dict]:
+    """Read and analyze syslog; returns None when syslog isn't available."""
+    syslog_path = "/var/log/messages"
+    if not os.path.exists(syslog_path):
+        return None
+
+    log_text = _read_tail(syslog_path)
+    result = analyze_log(log_text)
+    result["timestamp"] = _format_mtime(os.path.getmtime(syslog_path))
+    return {
+        "filename": "syslog",
+        "analysis": result
+    }
+
 @app.get("/analyze/embedded-cluster", response_model=List[LogFileResponse])
-async def analyze_embedded_cluster_logs(hours: int = 24):
+def analyze_embedded_cluster_logs(hours: int = 24):
     """
     Analyze logs from the embedded-cluster installation.
     Returns analysis of all log files from the specified time period.
     """
     try:
-        results = []
-        
-        # Check /var/log/embedded-cluster
-        log_dir = "/logs/embedded-cluster"
-        if os.path.exists(log_dir):
-            for log_file in glob.glob(f"{log_dir}/*.log"):
-                if os.path.getmtime(log_file) >= (datetime.now() - timedelta(hours=hours)).timestamp():
-                    with open(log_file, 'r') as f:
-                        log_text = f.read()
-                        result = analyze_log(log_text)
-                        result["timestamp"] = datetime.fromtimestamp(os.path.getmtime(log_file)).isoformat()
-                        results.append({
-                            "filename": os.path.basename(log_file),
-                            "analysis": result
-                        })
-        
-        # Check embedded-cluster data directory
-        data_log_dir = "/logs/embedded-cluster-data"
-        if os.path.exists(data_log_dir):
-            for log_file in glob.glob(f"{data_log_dir}/*.log"):
-                if os.path.getmtime(log_file) >= (datetime.now() - timedelta(hours=hours)).timestamp():
-                    with open(log_file, 'r') as f:
-                        log_text = f.read()
-                        result = analyze_log(log_text)
-                        result["timestamp"] = datetime.fromtimestamp(os.path.getmtime(log_file)).isoformat()
-                        results.append({
-                            "filename": os.path.basename(log_file),
-                            "analysis": result
-                        })
-        
-        # Get systemd service logs
-        services = ["k0scontroller.service", "k0sworker.service", "local-artifact-mirror.service"]
-        for service in services:
-            log_text = get_journalctl_logs(service, hours)
-            if log_text:
-                result = analyze_log(log_text)
-                result["timestamp"] = datetime.now().isoformat()
-                results.append({
-                    "filename": f"journalctl-{service}",
-                    "analysis": result
-                })
-        
-        return results
+        return _collect_embedded_cluster(hours)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing embedded-cluster logs: {str(e)}")
 
 @app.get("/analyze/pod-logs", response_model=List[LogFileResponse])
-async def analyze_pod_logs(namespace: Optional[str] = None, pod_name: Optional[str] = None, hours: int = 24):
+def analyze_pod_logs(namespace: Optional[str] = None, pod_name: Optional[str] = None, hours: int = 24):
     """
     Analyze pod logs from containerd directory.
     Returns analysis of all pod log files from the specified time period.
@@ -147,28 +330,22 @@ async def analyze_pod_logs(namespace: Optional[str] = None, pod_name: Optional[s
         raise HTTPException(status_code=500, detail=f"Error analyzing pod logs: {str(e)}")
 
 @app.get("/analyze/syslog", response_model=LogFileResponse)
-async def analyze_syslog(hours: int = 24):
+def analyze_syslog(hours: int = 24):
     """
     Analyze system logs from syslog.
     """
     try:
-        syslog_path = "/var/log/messages"
-        if not os.path.exists(syslog_path):
+        result = _collect_syslog(hours)
+        if result is None:
             raise HTTPException(status_code=404, detail="Syslog file not found")
-        
-        with open(syslog_path, 'r') as f:
-            log_text = f.read()
-            result = analyze_log(log_text)
-            result["timestamp"] = datetime.fromtimestamp(os.path.getmtime(syslog_path)).isoformat()
-            return {
-                "filename": "syslog",
-                "analysis": result
-            }
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing syslog: {str(e)}")
 
 @app.get("/analyze/all", response_model=ConsolidatedAnalysisResponse)
-async def analyze_all_logs(hours: int = 24):
+def analyze_all_logs(hours: int = 24):
     """
     Analyze all available log sources and provide a consolidated view of issues.
     Returns critical issues, warnings, and system status from all log sources.
@@ -177,13 +354,27 @@ async def analyze_all_logs(hours: int = 24):
         critical_issues = []
         warnings = []
         analyzed_sources = []
-        
+
+        # The three log sources are independent; collect them in parallel
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            embedded_future = pool.submit(_collect_embedded_cluster, hours)
+            pods_future = pool.submit(get_pod_logs, "/logs/pods", hours=hours)
+            syslog_future = pool.submit(_collect_syslog, hours)
+            embedded_logs = embedded_future.result()
+            pod_logs = pods_future.result()
+            try:
+                syslog = syslog_future.result()
+            except Exception as e:
+                # Syslog might not be readable (e.g. the path is a directory
+                # in the container image), that's okay
+                print(f"Error analyzing syslog: {str(e)}")
+                syslog = None
+
         # 1. Analyze embedded-cluster logs
-        embedded_logs = await analyze_embedded_cluster_logs(hours)
         if embedded_logs:
             analyzed_sources.append("embedded-cluster")
             for log in embedded_logs:
-                if "error" in log["analysis"]["root_cause"].lower() or "fail" in log["analysis"]["root_cause"].lower():
+                if log["analysis"]["severity"] == "critical":
                     critical_issues.append({
                         "source": "embedded-cluster",
                         "file": log["filename"],
@@ -202,11 +393,10 @@ async def analyze_all_logs(hours: int = 24):
                     })
         
         # 2. Analyze pod logs
-        pod_logs = await analyze_pod_logs(hours=hours)
         if pod_logs:
             analyzed_sources.append("pods")
             for log in pod_logs:
-                if "error" in log["analysis"]["root_cause"].lower() or "fail" in log["analysis"]["root_cause"].lower():
+                if log["analysis"]["severity"] == "critical":
                     critical_issues.append({
                         "source": "pods",
                         "file": log["filename"],
@@ -225,10 +415,9 @@ async def analyze_all_logs(hours: int = 24):
                     })
         
         # 3. Analyze syslog
-        try:
-            syslog = await analyze_syslog(hours)
+        if syslog is not None:
             analyzed_sources.append("syslog")
-            if "error" in syslog["analysis"]["root_cause"].lower() or "fail" in syslog["analysis"]["root_cause"].lower():
+            if syslog["analysis"]["severity"] == "critical":
                 critical_issues.append({
                     "source": "syslog",
                     "file": syslog["filename"],
@@ -245,10 +434,7 @@ async def analyze_all_logs(hours: int = 24):
                     "confidence": syslog["analysis"]["confidence"],
                     "next_steps": syslog["analysis"]["next_steps"]
                 })
-        except HTTPException:
-            # Syslog might not be available, that's okay
-            pass
-        
+
         # Determine overall system status
         system_status = {
             "status": "healthy" if not critical_issues else "unhealthy",